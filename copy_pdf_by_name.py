@@ -6,9 +6,31 @@
 """
 
 import os
+import re
+import json
 import shutil
+import argparse
+import concurrent.futures
 import yaml
 from logging_config import setup_logger
+from pool_utils import PDF_SUFFIXES
+
+try:
+    # 可选依赖：pyahocorasick，多模式匹配时与模式数量无关
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Linux FICLONE ioctl：在 Btrfs/XFS 等写时复制文件系统上创建共享数据块的副本
+FICLONE = 0x40049409
+
+# 1 MiB 复制缓冲区，用于无法使用零拷贝系统调用时的 read/write 循环
+shutil.COPY_BUFSIZE = 1024 * 1024
 
 
 def load_config(config_path="config.yaml"):
@@ -18,19 +40,168 @@ def load_config(config_path="config.yaml"):
 
 
 def load_match_strings(file_path):
-    """从文本文件中读取匹配字符串列表"""
+    """从文本文件中逐行读取匹配字符串，返回去重后的 frozenset"""
     with open(file_path, "r", encoding="utf-8") as f:
-        return [line.strip() for line in f if line.strip()]
+        return frozenset(s for s in map(str.strip, f) if s)
+
+
+def build_matcher(match_strings):
+    """
+    根据匹配字符串构建多模式匹配函数。
+
+    返回的函数接收文件名，返回文件名中出现的所有匹配字符串列表。
+    优先使用 Aho-Corasick 自动机；未安装 pyahocorasick 时退回到正则交替匹配。
+    """
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for s in match_strings:
+            automaton.add_word(s, s)
+        if len(automaton) == 0:
+            return lambda name: []
+        automaton.make_automaton()
+        return lambda name: [s for _, s in automaton.iter(name)]
+
+    if not match_strings:
+        return lambda name: []
+    # 正则交替只用于快速判断是否命中：同一位置只会返回一个候选，
+    # 因此命中后再逐个检查，返回文件名中出现的全部匹配字符串，与 Aho-Corasick 一致
+    pattern = re.compile("|".join(map(re.escape, match_strings)))
+
+    def find_matches(name):
+        if pattern.search(name) is None:
+            return []
+        return [s for s in match_strings if s in name]
+
+    return find_matches
+
+
+def _fast_copy(src_path, dst_path):
+    """复制文件内容并保留时间戳等元数据，优先使用 reflink。"""
+    if fcntl is not None:
+        try:
+            with open(src_path, "rb") as fsrc, open(dst_path, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            shutil.copystat(src_path, dst_path)
+            return
+        except OSError:
+            # 文件系统不支持 reflink，退回到普通复制
+            pass
+    shutil.copyfile(src_path, dst_path)
+    shutil.copystat(src_path, dst_path)
+
+
+def _reserve_path(output_dir, file):
+    """
+    在输出目录中原子地创建一个唯一的空文件并返回其路径。
+
+    目标文件已存在时依次尝试添加序号 _1、_2……，
+    O_CREAT|O_EXCL 保证每个名称只会被占用一次。
+    """
+    base, ext = os.path.splitext(file)
+    dst_path = os.path.join(output_dir, file)
+    counter = 0
+    while True:
+        try:
+            fd = os.open(dst_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            os.close(fd)
+            return dst_path
+        except FileExistsError:
+            counter += 1
+            dst_path = os.path.join(output_dir, f"{base}_{counter}{ext}")
+
+
+def load_pdf_index(index_path):
+    """读取目录索引文件，文件不存在或损坏时返回空索引"""
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
 
+def save_pdf_index(index_path, index):
+    """写入目录索引文件（先写临时文件再替换）"""
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
 
-def find_and_copy_pdfs(target_dirs, match_strings, output_dir, logger):
-    """查找并复制匹配的PDF文件"""
+
+def _scan_dir(current_dir, mtime):
+    """扫描单个目录，返回 {"mtime", "pdfs", "subdirs"} 记录；无法读取时返回 None"""
+    try:
+        it = os.scandir(current_dir)
+    except OSError:
+        # 与 os.walk 一致：忽略无法读取的子目录
+        return None
+    pdfs = []
+    subdirs = []
+    with it:
+        for entry in it:
+            # DirEntry 已缓存文件类型，无需额外 stat
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            elif entry.name.endswith(PDF_SUFFIXES):
+                # 与 os.walk 一致：指向 PDF 的符号链接也会被复制
+                pdfs.append(entry.name)
+    return {"mtime": mtime, "pdfs": pdfs, "subdirs": subdirs}
+
+
+def iter_pdf_paths(target_dir, old_index, new_index):
+    """
+    递归遍历目录，逐个返回 PDF 文件的 (路径, 文件名)。
+
+    目录的 mtime 与索引 old_index 中记录的一致时（目录内没有增删文件），
+    直接使用索引中的文件列表而不重新扫描；遍历到的目录记录写入 new_index。
+    """
+    stack = [target_dir]
+    while stack:
+        current_dir = stack.pop()
+        try:
+            mtime = os.stat(current_dir).st_mtime_ns
+        except OSError:
+            continue
+
+        record = old_index.get(current_dir)
+        if not record or record.get("mtime") != mtime:
+            record = _scan_dir(current_dir, mtime)
+            if record is None:
+                continue
+        new_index[current_dir] = record
+
+        stack.extend(os.path.join(current_dir, d) for d in record["subdirs"])
+        for name in record["pdfs"]:
+            yield os.path.join(current_dir, name), name
+
+
+def find_and_copy_pdfs(
+    target_dirs,
+    match_strings,
+    output_dir,
+    logger,
+    max_workers=8,
+    index_path=None,
+    rescan=False,
+):
+    """
+    查找并复制匹配的PDF文件
+
+    指定 index_path 时使用目录索引文件，只重新扫描内容有变化的目录；
+    rescan=True 时忽略已有索引，全部重新扫描。
+    """
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
 
+    old_index = load_pdf_index(index_path) if index_path and not rescan else {}
+    new_index = {}
+
     copied_files = 0
     # 用于跟踪每个匹配字符串是否找到对应的PDF
     unmatched_strings = set(match_strings)
+    find_matches = build_matcher(match_strings)
+
+    # 先在主线程中确定所有 (源路径, 目标路径, 命中字符串)，保证目标文件名唯一
+    copy_jobs = []
 
     for target_dir in target_dirs:
         logger.info("正在处理目录：%s", target_dir)
@@ -41,42 +212,52 @@ def find_and_copy_pdfs(target_dirs, match_strings, output_dir, logger):
             continue
 
         # 遍历目录中的所有PDF文件
-        for root, _, files in os.walk(target_dir):
-            for file in files:
-                if not file.lower().endswith(".pdf"):
-                    continue
-
-                # 检查文件名是否包含任意匹配字符串
-                for match_str in match_strings:
-                    if match_str in file:
-                        src_path = os.path.join(root, file)
-                        dst_path = os.path.join(output_dir, file)
-
-                        try:
-                            # 如果目标文件已存在，添加序号
-                            if os.path.exists(dst_path):
-                                base, ext = os.path.splitext(file)
-                                counter = 1
-                                while os.path.exists(dst_path):
-                                    new_name = f"{base}_{counter}{ext}"
-                                    # Split long line into multiple lines
-                                    dst_path = os.path.join(
-                                        output_dir,
-                                        new_name,
-                                    )
-                                    counter += 1
-
-                            # 复制文件
-                            shutil.copy2(src_path, dst_path)
-                            dst_name = os.path.basename(dst_path)
-                            logger.info("已复制文件：%s -> %s", file, dst_name)
-                            copied_files += 1
-                            # 从未匹配集合中移除已匹配的字符串
-                            unmatched_strings.discard(match_str)
-                        except (OSError, IOError) as e:
-                            logger.error("复制文件时出错 %s: %s", file, str(e))
-
-                        break  # 找到匹配后就跳出内层循环
+        for src_path, file in iter_pdf_paths(target_dir, old_index, new_index):
+
+            # 检查文件名是否包含任意匹配字符串
+            hits = find_matches(file)
+            if not hits:
+                continue
+
+            try:
+                # 如果目标文件已存在，添加序号
+                dst_path = _reserve_path(output_dir, file)
+            except OSError as e:
+                logger.error("复制文件时出错 %s: %s", file, str(e))
+                continue
+            copy_jobs.append((src_path, dst_path, hits))
+
+    if index_path:
+        try:
+            # 保留其它目标目录的旧记录，更新本次遍历到的目录
+            save_pdf_index(index_path, {**old_index, **new_index})
+        except OSError as e:
+            logger.warning("写入目录索引失败 %s: %s", index_path, str(e))
+
+    # 复制属于 I/O 密集型操作，读写期间会释放 GIL，使用线程池并行复制
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_job = {
+            executor.submit(_fast_copy, src_path, dst_path): (src_path, dst_path, hits)
+            for src_path, dst_path, hits in copy_jobs
+        }
+
+        for future in concurrent.futures.as_completed(future_to_job):
+            src_path, dst_path, hits = future_to_job[future]
+            file = os.path.basename(src_path)
+            try:
+                future.result()
+                dst_name = os.path.basename(dst_path)
+                logger.info("已复制文件：%s -> %s", file, dst_name)
+                copied_files += 1
+                # 从未匹配集合中移除文件名中出现的所有匹配字符串
+                unmatched_strings.difference_update(hits)
+            except (OSError, IOError) as e:
+                logger.error("复制文件时出错 %s: %s", file, str(e))
+                # 删除预留的空文件
+                try:
+                    os.remove(dst_path)
+                except OSError:
+                    pass
 
     return copied_files, unmatched_strings
 
@@ -85,6 +266,12 @@ def main():
     """
     根据配置文件复制匹配的PDF文件。
     """
+    parser = argparse.ArgumentParser(description="根据文件名复制匹配的 PDF 文件")
+    parser.add_argument(
+        "--rescan", action="store_true", help="忽略目录索引，重新扫描所有目录"
+    )
+    args = parser.parse_args()
+
     # 设置日志记录
     logger = setup_logger(log_file="./logs/copy_pdf_by_name.log")
 
@@ -102,6 +289,9 @@ def main():
             match_strings,
             config["output_directory"],
             logger,
+            max_workers=config.get("copy_workers", 8),
+            index_path=config.get("pdf_index", ".pdf_index.json"),
+            rescan=args.rescan,
         )
 
         logger.info("处理完成！共复制了 %d 个文件", copied_count)
@@ -4,6 +4,10 @@ This module provides a small helper `setup_logger` that configures a
 root logger with a console handler and a file handler. It is intended for
 simple scripts and small projects that need consistent logging output.
 
+For multiprocessing, worker processes call `setup_logger_for_worker(queue)`
+so that their records are sent through a queue to a single
+`QueueListener` in the main process, which does all the console/file I/O.
+
 Usage:
     from logging_config import setup_logger
     logger = setup_logger(log_level=logging.INFO, log_file='./logs/app.log')
@@ -13,6 +17,7 @@ The `setup_logger` function returns the configured root logger object.
 """
 
 import logging
+import logging.handlers
 import os
 import sys
 
@@ -20,13 +25,21 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 
-def setup_logger(log_level=logging.DEBUG, log_file="./logs/app.log", mode="a"):
+def setup_logger(
+    log_level=logging.DEBUG,
+    log_file="./logs/app.log",
+    mode="a",
+    max_bytes=0,
+    backup_count=0,
+):
     """
     设置日志记录器。
 
     :param log_level: 日志级别，默认为 DEBUG。
     :param log_file: 日志文件路径，默认为 ./logs/app.log。
     :param mode: 文件打开模式，默认为 'a' (追加)。使用 'w' 可覆盖。
+    :param max_bytes: 单个日志文件的最大字节数，超过后轮转；默认 0 表示不轮转。
+    :param backup_count: 轮转时保留的历史日志文件数量。
     :return: 配置好的日志记录器。
     """
     # 创建日志文件夹
@@ -45,8 +58,15 @@ def setup_logger(log_level=logging.DEBUG, log_file="./logs/app.log", mode="a"):
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(logging.Formatter(log_format))
 
-        # 文件日志处理器
-        file_handler = logging.FileHandler(log_file, mode=mode, encoding="utf-8")
+        # 文件日志处理器；delay=True 表示第一次写日志时才打开文件
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file,
+            mode=mode,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+            delay=True,
+        )
         file_handler.setFormatter(logging.Formatter(log_format))
 
         # 添加处理器
@@ -56,6 +76,28 @@ def setup_logger(log_level=logging.DEBUG, log_file="./logs/app.log", mode="a"):
     return log
 
 
+def setup_logger_for_worker(queue, log_level=logging.DEBUG):
+    """
+    设置子进程的日志记录器，只安装一个 QueueHandler。
+
+    日志记录通过队列发送到主进程的 QueueListener，由主进程统一写入控制台和文件，
+    避免多个进程争抢同一个日志文件。
+
+    :param queue: 与主进程 QueueListener 共享的队列。
+    :param log_level: 日志级别，默认为 DEBUG。
+    :return: 配置好的日志记录器。
+    """
+    log = logging.getLogger()
+    log.setLevel(log_level)
+
+    # fork 方式创建的子进程会继承主进程的处理器，需要先移除
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+    log.addHandler(logging.handlers.QueueHandler(queue))
+
+    return log
+
+
 # 单独运行时的测试代码
 if __name__ == "__main__":
     # 示例日志文件路径（常量风格）
@@ -12,9 +12,26 @@ import os
 import argparse
 import yaml
 import logging
+import csv
+import itertools
 import concurrent.futures
-from logging_config import setup_logger
+import logging.handlers
+import multiprocessing
+import pytesseract
+from PIL import Image
+from logging_config import setup_logger, setup_logger_for_worker
 from pdf_ocr_extractor import PdfOcrExtractor
+from pool_utils import PDF_SUFFIXES, pool_size
+
+# 每个工作进程内复用的提取器实例，由 _init_worker 创建
+_EXTRACTOR = None
+
+# 汇总 CSV 每写入多少行刷新一次缓冲区
+CSV_FLUSH_ROWS = 100
+
+# 记录已成功处理的 PDF 路径的文件名（位于 output_directory 下），每行一个路径；
+# 没有任何匹配的 PDF 不会出现在汇总 CSV 中，依靠该文件才能在下次运行时跳过
+PROCESSED_LEDGER = "processed.txt"
 
 
 def load_config(config_path="./config_B24.yaml"):
@@ -23,16 +40,34 @@ def load_config(config_path="./config_B24.yaml"):
     return conf
 
 
-def process_pdf_wrapper(args):
+def _init_worker(config, log_queue):
+    """
+    工作进程初始化函数：每个进程只创建一次提取器，并预热 Tesseract。
+    日志通过 log_queue 发送到主进程统一输出。
+    """
+    global _EXTRACTOR
+    setup_logger_for_worker(log_queue)
+    _EXTRACTOR = PdfOcrExtractor(config)
+    if _EXTRACTOR.uses_tesserocr:
+        # 使用 tesserocr 时模型已在创建提取器时加载，无需预热
+        return
+    try:
+        # 识别一张空白小图，使语言模型文件进入系统页缓存
+        pytesseract.image_to_string(
+            Image.new("L", (8, 8), 255), lang=_EXTRACTOR.ocr_language
+        )
+    except Exception as e:
+        _EXTRACTOR.logger.debug("Tesseract 预热失败: %s", e)
+
+
+def process_pdf_wrapper(pdf_path):
     """
     并行处理的包装函数。
     """
-    pdf_path, config = args
     try:
-        extractor = PdfOcrExtractor(config)
         # 修正：extract_matches_from_pdf 现在返回 (matches, error)
         # 我们需要确保 pdf_ocr_extractor.py 也是这样实现的
-        result = extractor.extract_matches_from_pdf(pdf_path)
+        result = _EXTRACTOR.extract_matches_from_pdf(pdf_path)
 
         # 健壮性检查：根据返回值类型进行适配
         if isinstance(result, tuple) and len(result) == 2:
@@ -45,11 +80,70 @@ def process_pdf_wrapper(args):
         return None, str(e)
 
 
+def _iter_pdfs(pdf_directory):
+    """
+    使用 os.scandir 逐个返回目录下 PDF 文件的路径（不递归）。
+    """
+    with os.scandir(pdf_directory) as it:
+        for entry in it:
+            if entry.name.endswith(PDF_SUFFIXES) and entry.is_file(
+                follow_symlinks=False
+            ):
+                yield entry.path
+
+
+def _load_processed_pdfs(csv_path, ledger_path):
+    """
+    读取汇总 CSV 与已处理记录文件中的 pdf_path 集合，用于跳过已处理的文件。
+    """
+    processed = set()
+    if os.path.exists(csv_path):
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # 跳过表头
+            processed.update(row[0] for row in reader if row)
+    if os.path.exists(ledger_path):
+        with open(ledger_path, "r", encoding="utf-8") as f:
+            processed.update(line.rstrip("\n") for line in f if line.strip())
+    return processed
+
+
+def _is_processed(pdf_path, output_directory, processed_pdfs):
+    """
+    判断 PDF 是否已在之前的运行中产生过匹配结果。
+    """
+    if pdf_path in processed_pdfs:
+        return True
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.exists(
+        os.path.join(output_directory, f"{base_name}_matches.csv")
+    )
+
+
+def _iter_pending_pdfs(pdf_directory, output_directory, processed_pdfs, logger):
+    """
+    逐个返回需要处理的 PDF 路径；processed_pdfs 为 None 时不跳过任何文件。
+    """
+    skipped = 0
+    for pdf_path in _iter_pdfs(pdf_directory):
+        if processed_pdfs is not None and _is_processed(
+            pdf_path, output_directory, processed_pdfs
+        ):
+            skipped += 1
+            continue
+        yield pdf_path
+    if skipped:
+        logger.info("跳过 %d 个已处理的 PDF 文件（使用 --force 重新处理）。", skipped)
+
+
 def main():
     parser = argparse.ArgumentParser(description="PDF OCR Extractor Runner")
     parser.add_argument(
         "--config", type=str, default="./config_B24.yaml", help="配置文件路径"
     )
+    parser.add_argument(
+        "--force", action="store_true", help="重新处理已处理过的 PDF 文件"
+    )
     args = parser.parse_args()
 
     try:
@@ -66,46 +160,110 @@ def main():
         logger.error("PDF 目录不存在或未指定: %s", pdf_directory)
         return
 
-    pdf_files = [
-        os.path.join(pdf_directory, f)
-        for f in os.listdir(pdf_directory)
-        if f.lower().endswith(".pdf")
-    ]
-    total_files = len(pdf_files)
+    # 所有 PDF 的匹配结果写入同一个汇总 CSV，只打开一次
+    output_directory = config.get("output_directory", "./output")
+    csv_path = config.get("matches_csv") or os.path.join(
+        output_directory, "matches.csv"
+    )
+    os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+    file_exists = os.path.exists(csv_path)
+    os.makedirs(output_directory, exist_ok=True)
+    ledger_path = os.path.join(output_directory, PROCESSED_LEDGER)
+
+    # 跳过之前运行中已处理过的 PDF，除非指定 --force
+    processed_pdfs = (
+        None if args.force else _load_processed_pdfs(csv_path, ledger_path)
+    )
+    pdf_iter = _iter_pending_pdfs(
+        pdf_directory, output_directory, processed_pdfs, logger
+    )
 
-    if total_files == 0:
+    # 先取出第一个文件判断是否有待处理的 PDF，无需列出整个目录
+    first_pdf = next(pdf_iter, None)
+    if first_pdf is None:
         logger.info("未找到 PDF 文件。")
         return
 
-    logger.info("准备处理 %d 个 PDF 文件...", total_files)
     count = 0
 
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        future_to_pdf = {
-            executor.submit(process_pdf_wrapper, (pdf_path, config)): pdf_path
-            for pdf_path in pdf_files
-        }
-
-        for future in concurrent.futures.as_completed(future_to_pdf):
-            pdf_path = future_to_pdf[future]
-            file_name = os.path.basename(pdf_path)
-            try:
-                matches, error = future.result()
-                if error:
-                    logger.error("处理文件 %s 时出错: %s", file_name, error)
-                else:
-                    count += 1
-                    status = f"找到 {len(matches)} 条匹配" if matches else "未找到匹配"
-                    logger.info(
-                        "已完成 (%d/%d): %s [%s]", count, total_files, file_name, status
-                    )
-            except Exception as exc:
-                logger.error("处理文件 %s 时发生未捕获异常: %s", file_name, exc)
+    # Tesseract 自身也会使用多线程，限制进程数以免过度订阅 CPU；
+    # 任务边遍历目录边提交，文件数事先未知，不使用 chunksize
+    max_workers, _ = pool_size(None, logger, max_workers=8)
+
+    # 子进程的日志经队列交给主进程的处理器输出
+    manager = multiprocessing.Manager()
+    log_queue = manager.Queue(-1)
+    listener = logging.handlers.QueueListener(
+        log_queue, *logger.handlers, respect_handler_level=True
+    )
+    listener.start()
+
+    # 子进程异常或 Ctrl+C 中断时也要停止日志监听线程并关闭 Manager 进程
+    try:
+        # 记录文件在汇总 CSV 之后关闭，保证记录为已处理的 PDF 其匹配结果已写入 CSV
+        with open(ledger_path, "a", encoding="utf-8") as ledger, open(
+            csv_path, "a", encoding="utf-8", newline=""
+        ) as csvfile, concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(config, log_queue),
+        ) as executor:
+            writer = csv.writer(csvfile)
+            if not file_exists:
+                writer.writerow(["pdf_path", "page", "text"])
+            pending_rows = 0
+            # 已完成但尚未写入记录文件的 PDF 路径
+            pending_done = []
+
+            def flush():
+                # 先刷新 CSV 再写记录文件，中途退出时不会把结果丢失的 PDF 记为已处理
+                csvfile.flush()
+                ledger.writelines(f"{path}\n" for path in pending_done)
+                ledger.flush()
+                pending_done.clear()
+
+            # 边遍历目录边提交任务，同时统计文件数
+            future_to_pdf = {}
+            for pdf_path in itertools.chain([first_pdf], pdf_iter):
+                future_to_pdf[executor.submit(process_pdf_wrapper, pdf_path)] = pdf_path
+            total_files = len(future_to_pdf)
+            logger.info("准备处理 %d 个 PDF 文件...", total_files)
+
+            for future in concurrent.futures.as_completed(future_to_pdf):
+                pdf_path = future_to_pdf[future]
+                file_name = os.path.basename(pdf_path)
+                try:
+                    matches, error = future.result()
+                    if error:
+                        logger.error("处理文件 %s 时出错: %s", file_name, error)
+                    else:
+                        count += 1
+                        if matches:
+                            writer.writerows(matches)
+                            pending_rows += len(matches)
+                        pending_done.append(pdf_path)
+                        if (
+                            pending_rows >= CSV_FLUSH_ROWS
+                            or len(pending_done) >= CSV_FLUSH_ROWS
+                        ):
+                            flush()
+                            pending_rows = 0
+                        status = f"找到 {len(matches)} 条匹配" if matches else "未找到匹配"
+                        logger.info(
+                            "已完成 (%d/%d): %s [%s]", count, total_files, file_name, status
+                        )
+                except Exception as exc:
+                    logger.error("处理文件 %s 时发生未捕获异常: %s", file_name, exc)
+
+            flush()
+    finally:
+        listener.stop()
+        manager.shutdown()
 
     logger.info(
         "所有任务完成，共处理了 %d 个 PDF 文件。结果保存在 %s",
         count,
-        config.get("output_directory"),
+        csv_path,
     )
 
 
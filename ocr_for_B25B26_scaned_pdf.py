@@ -34,8 +34,12 @@ import logging
 import csv
 import concurrent.futures
 from logging_config import setup_logger
+from pool_utils import PDF_SUFFIXES, iter_map_results, pool_size
 from pdf_ocr_extractor import PdfOcrExtractor
 
+# 工作进程内的提取器实例，由 _init_worker 在进程启动时创建
+_EXTRACTOR = None
+
 
 def load_config(config_path="./config_B25B26.yaml"):
     """从 YAML 配置文件加载配置并返回字典。"""
@@ -44,20 +48,26 @@ def load_config(config_path="./config_B25B26.yaml"):
     return conf
 
 
-def process_pdf_wrapper(args):
+def _init_worker(config):
+    """
+    工作进程初始化函数：每个进程只创建一次提取器，
+    Tesseract 模型等资源在该进程处理的所有 PDF 之间复用。
+    """
+    global _EXTRACTOR
+    # 注意：这里不传递主进程的 logger，避免 pickle 问题
+    # 提取器会使用默认的 logger，可能会输出到控制台
+    _EXTRACTOR = PdfOcrExtractor(config)
+
+
+def process_pdf_wrapper(pdf_path):
     """
     并行处理的包装函数。
 
-    :param args: 元组 (pdf_path, config)
+    :param pdf_path: PDF 文件路径
     :return: (matches, error_message)
     """
-    pdf_path, config = args
     try:
-        # 在子进程中初始化提取器
-        # 注意：这里不传递主进程的 logger，避免 pickle 问题
-        # 提取器会使用默认的 logger，可能会输出到控制台
-        extractor = PdfOcrExtractor(config)
-        matches = extractor.extract_matches_from_pdf(pdf_path)
+        matches = _EXTRACTOR.extract_matches_from_pdf(pdf_path)
         return matches, None
     except Exception as e:
         return None, str(e)
@@ -95,11 +105,12 @@ def main():
     logger.info("开始处理目录 %s 中的所有PDF文件...", pdf_directory)
 
     # 收集所有 PDF 文件路径
-    pdf_files = [
-        os.path.join(pdf_directory, f)
-        for f in os.listdir(pdf_directory)
-        if f.lower().endswith(".pdf")
-    ]
+    with os.scandir(pdf_directory) as it:
+        pdf_files = [
+            e.path
+            for e in it
+            if e.name.endswith(PDF_SUFFIXES) and e.is_file(follow_symlinks=False)
+        ]
 
     total_files = len(pdf_files)
     if total_files == 0:
@@ -111,28 +122,23 @@ def main():
     all_matches = []
     count = 0
 
+    max_workers, chunksize = pool_size(total_files, logger)
+
     # 使用 ProcessPoolExecutor 进行并行处理
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        # 提交任务
-        future_to_pdf = {
-            executor.submit(process_pdf_wrapper, (pdf_path, config)): pdf_path
-            for pdf_path in pdf_files
-        }
-
-        for future in concurrent.futures.as_completed(future_to_pdf):
-            pdf_path = future_to_pdf[future]
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker, initargs=(config,)
+    ) as executor:
+        for pdf_path, (matches, error) in iter_map_results(
+            executor, process_pdf_wrapper, pdf_files, chunksize, logger
+        ):
             file_name = os.path.basename(pdf_path)
-            try:
-                matches, error = future.result()
-                if error:
-                    logger.error("处理文件 %s 时出错: %s", file_name, error)
-                else:
-                    if matches:
-                        all_matches.extend(matches)
-                    count += 1
-                    logger.info("已完成 (%d/%d): %s", count, total_files, file_name)
-            except Exception as exc:
-                logger.error("处理文件 %s 时发生未捕获异常: %s", file_name, exc)
+            if error:
+                logger.error("处理文件 %s 时出错: %s", file_name, error)
+            else:
+                if matches:
+                    all_matches.extend(matches)
+                count += 1
+                logger.info("已完成 (%d/%d): %s", count, total_files, file_name)
 
     # 合并所有匹配结果
     if all_matches:
@@ -152,12 +158,14 @@ def main():
 
         file_exists = os.path.exists(csv_path)
         try:
-            with open(csv_path, "a", encoding="utf-8", newline="") as csvfile:
+            # 1 MiB 写缓冲，配合 writerows 一次写入所有行
+            with open(
+                csv_path, "a", encoding="utf-8", newline="", buffering=1 << 20
+            ) as csvfile:
                 writer = csv.writer(csvfile)
                 if not file_exists:
                     writer.writerow(["pdf_path", "page", "text"])
-                for pdf_path, page, text in all_matches:
-                    writer.writerow([pdf_path, page, text])
+                writer.writerows(all_matches)
             logger.info("已将 %d 条匹配写入 CSV: %s", len(all_matches), csv_path)
         except (OSError, PermissionError, csv.Error) as exc:
             logger.exception("将匹配写入 CSV 时发生错误: %s; 异常: %s", csv_path, exc)
@@ -4,11 +4,55 @@
 """
 
 import os
+import concurrent.futures
 import logging
 import csv
+import hashlib
+import math
+import multiprocessing.util
 import re
+import shutil
+import subprocess
+import tempfile
+import uuid
 from pdf2image import convert_from_path
+from PIL import Image, ImageOps
 import pytesseract
+from regex_utils import compile_regex
+
+# 限制 Tesseract/OpenMP 每个进程只使用一个线程（需在加载 tesserocr 之前设置，
+# tesseract 子进程也会继承）；并行度由多进程 / page_workers 提供
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+try:
+    # 可选依赖：pypdfium2，在进程内直接渲染页面，无需启动 pdftoppm 子进程
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    # 可选依赖：PyMuPDF，用于直接读取 PDF 自带的文本层；
+    # 新版本中导入 fitz 会输出弃用警告，优先使用 pymupdf 模块名
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+
+try:
+    # 可选依赖：tesserocr，直接调用 libtesseract，模型在进程内只加载一次
+    from tesserocr import PSM, PyTessBaseAPI
+except ImportError:
+    PyTessBaseAPI = None
+
+try:
+    # 可选依赖：OpenCV + NumPy，用于 OCR 前的图像二值化
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+    np = None
 
 
 # 设置 Tesseract 可执行路径（按需修改）
@@ -16,6 +60,26 @@ pytesseract.pytesseract.tesseract_cmd = (
     r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
 )
 
+# ocr_downscale 开启时页面图像的最大尺寸 (宽, 高)
+OCR_MAX_SIZE = (2000, 3000)
+
+# preprocess 为 "threshold" 时使用的全局灰度阈值（自动对比度拉伸之后）
+BINARIZE_THRESHOLD = 180
+
+# skip_if_text_layer 开启时，据以判断 PDF 是否为电子版（含文本层）的前几页页数
+TEXT_LAYER_PROBE_PAGES = 3
+
+# 解析 Tesseract OSD 输出中的旋转角度，如 "Rotate: 90"
+OSD_ROTATE_RE = re.compile(r"Rotate: (\d+)")
+
+
+def _release_resources(tmpdir, apis):
+    """结束 Tesseract 实例并删除临时目录（由 PdfOcrExtractor 的终结器调用）。"""
+    for api in apis:
+        api.End()
+    apis.clear()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
 
 class PdfOcrExtractor:
     """PDF OCR 提取器类"""
@@ -30,51 +94,277 @@ class PdfOcrExtractor:
         self.config = config
         self.logger = logger or logging.getLogger(__name__)
 
-        self.dpi = config.get("dpi", 300)
+        # Tesseract 的 LSTM 耗时与像素数成正比；中文正文 (>=8pt) 在 200~250 DPI
+        # 时识别率已基本饱和，只有更小的字号才需要 300 DPI
+        self.dpi = config.get("dpi", 220)
         self.ocr_language = config.get("ocr_language", "chi_sim")
         self.output_directory = config.get("output_directory", "./output")
         self.matches_csv = config.get("matches_csv")
+        # 是否为每个 PDF 单独输出 {文件名}_matches.csv（调试用），
+        # 默认只返回匹配结果，由调用方统一写入汇总 CSV
+        self.individual_csv = config.get("individual_csv", False)
         self.marker = config.get("marker", "设计变更通知单")
+        # 是否使用 google-re2 匹配正则（需安装 google-re2；re2 中 \d、\w、\s 只匹配 ASCII）
+        self.use_re2 = config.get("use_re2", False)
+        self._marker_re = compile_regex(re.escape(self.marker), self.use_re2)
         self.auto_rotate = config.get("auto_rotate", False)  # 是否自动修正图像方向
+        # 是否在 OCR 前将过宽的页面图像缩小到 OCR_MAX_SIZE 以内
+        self.ocr_downscale = config.get("ocr_downscale", False)
+        # OCR 前的二值化方式：
+        #   "adaptive"  - OpenCV 高斯自适应阈值，适应光照不均（需安装 opencv-python）
+        #   "threshold" - PIL 自动对比度 + 全局阈值，无额外依赖
+        #   true 表示已安装 OpenCV 时用 "adaptive"，否则用 "threshold"；false 不处理
+        preprocess = config.get("preprocess", False)
+        if preprocess is True:
+            preprocess = "adaptive" if cv2 is not None else "threshold"
+        if preprocess == "adaptive" and cv2 is None:
+            self.logger.warning("未安装 OpenCV，preprocess 改用 threshold 方式。")
+            preprocess = "threshold"
+        if preprocess not in (False, None, "adaptive", "threshold"):
+            self.logger.warning("未知的 preprocess 配置: %s，忽略。", preprocess)
+            preprocess = False
+        self.preprocess = preprocess or False
         # 新增：从配置中读取内容正则表达式（支持字符串或列表）
         self.content_regex = config.get("content_regex")
+        # pdftoppm 内部线程数；多进程并行时保持为 1，避免过度竞争 CPU
+        self.pdf_thread_count = config.get("pdf_thread_count", 1)
+        # 单个 PDF 内并行运行的 tesseract 进程数；由多进程脚本调用时保持为 1。
+        # 只对 tesseract 命令行后端有效，使用 tesserocr 时逐页顺序识别
+        self.page_workers = max(1, config.get("page_workers", 1))
+        # 安装了 pypdfium2 时使用其在进程内渲染页面，否则使用 pdf2image (pdftoppm)
+        self.use_pdfium = config.get("use_pdfium", True) and pdfium is not None
+
+        # 是否优先使用 PDF 自带的文本层（需安装 PyMuPDF），
+        # 文本少于 text_layer_min_chars 个字符的页面才进行 OCR
+        self.use_text_layer = config.get("use_text_layer", True) and fitz is not None
+        self.text_layer_min_chars = config.get("text_layer_min_chars", 20)
+        # 前 TEXT_LAYER_PROBE_PAGES 页中有页面含文本层时，视为电子版 PDF，
+        # 完全跳过 OCR（其余文本较少的页面也不再识别）
+        self.skip_if_text_layer = config.get("skip_if_text_layer", False)
+        if self.skip_if_text_layer and not self.use_text_layer:
+            self.logger.warning(
+                "skip_if_text_layer 需要 use_text_layer 且已安装 PyMuPDF，"
+                "当前设置下所有页面仍会执行 OCR。"
+            )
+        # 是否缓存 OCR 结果；以 PDF 内容哈希为键，重复运行时跳过 OCR
+        self.ocr_cache = config.get("ocr_cache", True)
+        self._cache_dir = os.path.join(self.output_directory, "_ocr_cache")
 
         # 确保输出目录存在
         os.makedirs(self.output_directory, exist_ok=True)
 
+        # 页面图像的临时目录：pdftoppm 直接写入 JPEG 文件，OCR 时再逐页打开，
+        # 避免一次性在内存中保留整本 PDF 的 PIL 图像
+        self._tmpdir = tempfile.mkdtemp(prefix="pdf_ocr_")
+        # 需要在退出时 End() 的 tesserocr 实例
+        self._tess_apis = []
+        # multiprocessing 的终结器在对象被回收、主进程退出以及进程池子进程退出时都会执行；
+        # 子进程通过 os._exit 退出，atexit 和 __del__ 都不会运行
+        self._finalizer = multiprocessing.util.Finalize(
+            self,
+            _release_resources,
+            args=(self._tmpdir, self._tess_apis),
+            exitpriority=10,
+        )
+
+        # 安装了 tesserocr 时创建常驻的 Tesseract 实例，在所有页面和 PDF 之间复用，
+        # 避免每次 OCR 都启动 tesseract 进程并重新加载语言模型
+        self._api = None
+        # 方向检测 (OSD) 使用单独的实例，在第一次需要时创建；
+        # 创建失败（如缺少 osd.traineddata）后不再重试，以免每页都重新加载模型
+        self._osd_api = None
+        self._osd_failed = False
+        if PyTessBaseAPI is not None and config.get("use_tesserocr", True):
+            try:
+                self._api = PyTessBaseAPI(
+                    lang=self.ocr_language, psm=PSM.AUTO, **self._tessdata_kwargs()
+                )
+                self._tess_apis.append(self._api)
+            except RuntimeError as exc:
+                # 例如找不到 tessdata 或语言模型；退回到调用 tesseract 命令行
+                self.logger.warning(
+                    "tesserocr 初始化失败，改用 tesseract 命令行: %s", exc
+                )
+
+        if self._api is not None and self.page_workers > 1:
+            self.logger.info(
+                "使用 tesserocr 时 page_workers=%d 不生效，页面按顺序识别。",
+                self.page_workers,
+            )
+
         # 屏蔽 pytesseract 的 DEBUG 日志（包含临时文件路径等信息）
         logging.getLogger("pytesseract").setLevel(logging.INFO)
 
-    def _pdf_to_images(self, pdf_path, start_page=1):
-        """将 PDF 文件转换为 PIL Image 列表（每页一张）。"""
+    @property
+    def uses_tesserocr(self):
+        """是否使用 tesserocr 常驻实例识别（否则调用 tesseract 命令行）。"""
+        return self._api is not None
+
+    def _pdf_to_images(self, pdf_path, start_page=1, last_page=None):
+        """将 PDF 文件转换为页面图像文件，返回图像路径列表（每页一个）。"""
         try:
             self.logger.info(
                 "开始将PDF文件 %s 转换为图像(从第%d页开始)...", pdf_path, start_page
             )
-            # thread_count=1: 确保每个转换进程只使用一个线程，避免在多进程环境下过度竞争 CPU
-            images = convert_from_path(
-                pdf_path, dpi=self.dpi, first_page=start_page, thread_count=1
+            if self.use_pdfium:
+                image_paths = self._render_with_pdfium(pdf_path, start_page, last_page)
+                self.logger.info(
+                    "PDF文件 %s 成功转换为 %d 张图像。", pdf_path, len(image_paths)
+                )
+                return image_paths
+
+            # 单次 pdftoppm 调用输出到临时目录，只返回文件路径而不解码为 PIL 图像
+            image_paths = convert_from_path(
+                pdf_path,
+                dpi=self.dpi,
+                first_page=start_page,
+                last_page=last_page,
+                thread_count=self.pdf_thread_count,
+                fmt="jpeg",
+                jpegopt={"quality": 85, "progressive": False, "optimize": False},
+                grayscale=True,
+                output_folder=self._tmpdir,
+                paths_only=True,
+            )
+            self.logger.info(
+                "PDF文件 %s 成功转换为 %d 张图像。", pdf_path, len(image_paths)
             )
-            self.logger.info("PDF文件 %s 成功转换为 %d 张图像。", pdf_path, len(images))
-            return images
+            return image_paths
         except Exception as exc:
             self.logger.exception("转换PDF为图像时发生错误: %s", exc)
             raise
 
+    def _iter_pdfium_pages(self, pdf_path, start_page=1, last_page=None):
+        """使用 pypdfium2 逐页渲染灰度图像，依次返回 (页码, PIL 图像)。
+
+        每页在调用方处理完毕、继续迭代时立即关闭，内存中最多只保留一页位图。
+        """
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            page_count = len(pdf)
+            if last_page is None or last_page > page_count:
+                last_page = page_count
+            for index in range(start_page - 1, last_page):
+                page = pdf[index]
+                try:
+                    dpi = self._page_render_dpi(page, index + 1)
+                    image = page.render(scale=dpi / 72, grayscale=True).to_pil()
+                    try:
+                        yield index + 1, image
+                    finally:
+                        image.close()
+                finally:
+                    page.close()
+        finally:
+            pdf.close()
+
+    def _page_render_dpi(self, page, page_number):
+        """返回页面的渲染 DPI。
+
+        超大页面按 Image.MAX_IMAGE_PIXELS 降低 DPI，避免渲染出的图像
+        触发 PIL 的 DecompressionBomb 检查而导致整个 PDF 被跳过。
+        """
+        max_pixels = Image.MAX_IMAGE_PIXELS
+        if not max_pixels:
+            return self.dpi
+        width_pt, height_pt = page.get_size()
+        area_in = (width_pt / 72) * (height_pt / 72)
+        if area_in <= 0:
+            return self.dpi
+        max_dpi = max(1, math.floor(math.sqrt(max_pixels / area_in)))
+        if max_dpi >= self.dpi:
+            return self.dpi
+        self.logger.warning(
+            "第 %d 页尺寸过大 (%.1f x %.1f 英寸)，渲染 DPI 由 %d 降至 %d。",
+            page_number,
+            width_pt / 72,
+            height_pt / 72,
+            self.dpi,
+            max_dpi,
+        )
+        return max_dpi
+
+    def _render_with_pdfium(self, pdf_path, start_page=1, last_page=None):
+        """使用 pypdfium2 渲染页面并写入临时目录，返回图像路径列表。"""
+        image_paths = []
+        prefix = uuid.uuid4().hex
+        try:
+            for page_number, image in self._iter_pdfium_pages(
+                pdf_path, start_page, last_page
+            ):
+                image_path = os.path.join(
+                    self._tmpdir, f"{prefix}-{page_number:04d}.jpg"
+                )
+                image.save(image_path, format="JPEG", quality=85)
+                image_paths.append(image_path)
+        except Exception:
+            self._remove_files(image_paths)
+            raise
+        return image_paths
+
+    def _remove_files(self, paths):
+        """删除 OCR 过程中生成的临时文件。"""
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _tessdata_kwargs(self):
+        """返回创建 PyTessBaseAPI 时使用的 tessdata 路径参数。
+
+        未设置 TESSDATA_PREFIX 时，使用 tesseract_cmd 所在目录下的 tessdata
+        （Windows 安装包的默认布局）；否则交给 tesserocr 自行查找。
+        """
+        if os.environ.get("TESSDATA_PREFIX"):
+            return {}
+        tessdata = os.path.join(
+            os.path.dirname(pytesseract.pytesseract.tesseract_cmd), "tessdata"
+        )
+        if os.path.isdir(tessdata):
+            return {"path": tessdata + os.sep}
+        return {}
+
+    def _detect_rotation(self, image):
+        """使用 tesserocr 常驻实例检测方向，返回需要顺时针旋转的角度。"""
+        if self._osd_failed:
+            return 0
+        if self._osd_api is None:
+            try:
+                # psm 0: Orientation and script detection (OSD) only.
+                self._osd_api = PyTessBaseAPI(
+                    lang="osd", psm=PSM.OSD_ONLY, **self._tessdata_kwargs()
+                )
+            except RuntimeError as exc:
+                self._osd_failed = True
+                self.logger.warning("OSD 模型加载失败，跳过方向检测: %s", exc)
+                return 0
+            self._osd_api.SetVariable("min_characters_to_try", "5")
+            self._tess_apis.append(self._osd_api)
+        self._osd_api.SetImage(image)
+        osd = self._osd_api.DetectOrientationScript()
+        if not osd:
+            return 0
+        # orient_deg 为文字当前的逆时针旋转角度，与命令行输出的 "Rotate" 互补
+        return (360 - osd["orient_deg"]) % 360
+
     def _correct_orientation(self, image):
         """检测并修正图像方向。"""
         try:
-            # 使用 Tesseract 的 OSD 模式检测方向
-            # psm 0: Orientation and script detection (OSD) only.
-            osd = pytesseract.image_to_osd(
-                image, config="--psm 0 -c min_characters_to_try=5"
-            )
+            if self._api is not None:
+                rotate_angle = self._detect_rotation(image)
+            else:
+                # 使用 Tesseract 的 OSD 模式检测方向
+                # psm 0: Orientation and script detection (OSD) only.
+                osd = pytesseract.image_to_osd(
+                    image, config="--psm 0 -c min_characters_to_try=5"
+                )
 
-            rotate_angle = 0
-            # 解析 OSD 输出，查找 "Rotate: 90" 这样的行
-            search = re.search(r"Rotate: (\d+)", osd)
-            if search:
-                rotate_angle = int(search.group(1))
+                rotate_angle = 0
+                # 解析 OSD 输出，查找 "Rotate: 90" 这样的行
+                search = OSD_ROTATE_RE.search(osd)
+                if search:
+                    rotate_angle = int(search.group(1))
 
             if rotate_angle != 0:
                 self.logger.info("检测到图像需要旋转 %d 度", rotate_angle)
@@ -91,44 +381,313 @@ class PdfOcrExtractor:
 
         return image
 
-    def _ocr_images(self, images):
-        """对每页图像执行 OCR，返回每页文本的列表。"""
+    def _ocr_images(self, image_paths):
+        """对所有页面图像文件执行 OCR，返回每页文本的列表。
+
+        安装了 tesserocr 时使用进程内常驻的 Tesseract 实例逐页识别；
+        否则将页面按 page_workers 分成若干连续批次，每批只调用一次 tesseract。
+        """
+        if not image_paths:
+            return []
+
+        try:
+            self.logger.info("开始对 %d 页图像进行OCR识别...", len(image_paths))
+            # 如果开启了自动旋转、缩放或二值化，则先逐页处理并写回图像文件
+            if self.auto_rotate or self.ocr_downscale or self.preprocess:
+                for image_path in image_paths:
+                    self._prepare_image_file(image_path)
+
+            if self._api is not None:
+                text_per_page = []
+                for image_path in image_paths:
+                    with Image.open(image_path) as image:
+                        text_per_page.append(self._ocr_image(image))
+                self.logger.info("%d 页OCR识别完成。", len(text_per_page))
+                return text_per_page
+
+            workers = min(self.page_workers, len(image_paths))
+            if workers <= 1:
+                text_per_page = self._run_tesseract(image_paths)
+            else:
+                # tesseract 在子进程中运行，线程只负责等待，按连续页分批保持页序
+                size = -(-len(image_paths) // workers)
+                batches = [
+                    image_paths[i:i + size]
+                    for i in range(0, len(image_paths), size)
+                ]
+                with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=len(batches)
+                ) as executor:
+                    text_per_page = [
+                        text
+                        for texts in executor.map(self._run_tesseract, batches)
+                        for text in texts
+                    ]
+            self.logger.info("%d 页OCR识别完成。", len(text_per_page))
+            return text_per_page
+        except subprocess.CalledProcessError as exc:
+            self.logger.exception(
+                "OCR识别过程中发生错误: %s",
+                exc.stderr.decode("utf-8", errors="replace"),
+            )
+            raise
+        except Exception as exc:
+            self.logger.exception("OCR识别过程中发生错误: %s", exc)
+            raise
+
+    def _run_tesseract(self, image_paths):
+        """调用一次 tesseract 识别多张图像，返回每页文本的列表。
+
+        将图像路径写入列表文件后只启动一个 tesseract 进程，语言模型只加载一次；
+        tesseract 在每页输出之后写入换页符 (\\f)，据此拆分出每页文本。
+        效果与合成一个多页 TIFF 再调用一次 pytesseract 相同，但不必在内存中
+        解码全部页面并重新编码为 TIFF。
+        """
+        fd, list_path = tempfile.mkstemp(suffix=".txt", dir=self._tmpdir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as list_file:
+                list_file.write("\n".join(image_paths) + "\n")
+
+            result = subprocess.run(
+                [
+                    pytesseract.pytesseract.tesseract_cmd,
+                    list_path,
+                    "stdout",
+                    "-l",
+                    self.ocr_language,
+                ],
+                capture_output=True,
+                check=True,
+            )
+        finally:
+            self._remove_files([list_path])
+        pages = result.stdout.decode("utf-8").split("\x0c")
+
+        # 对齐到原始页序：多余的尾部片段丢弃，缺失的页补空字符串
+        text_per_page = pages[: len(image_paths)]
+        text_per_page += [""] * (len(image_paths) - len(text_per_page))
+        return text_per_page
+
+    def _ocr_image(self, image):
+        """使用常驻的 tesserocr 实例识别单张图像。"""
+        # 以 8 位灰度 (L) 交给 Tesseract，传入的数据量只有 RGB 的三分之一；
+        # 二值化后的 1 位图像 Tesseract 可直接处理
+        if image.mode not in ("L", "1"):
+            image = image.convert("L")
+        self._api.SetImage(image)
+        return self._api.GetUTF8Text()
+
+    def _prepare_image(self, image):
+        """按配置修正方向、缩小并二值化图像；无需处理时返回原图像对象。"""
+        prepared = image
+        if self.auto_rotate:
+            prepared = self._correct_orientation(prepared)
+        if self.ocr_downscale:
+            if prepared.mode != "L":
+                prepared = prepared.convert("L")
+            if prepared.width > OCR_MAX_SIZE[0]:
+                if prepared is image:
+                    prepared = image.copy()
+                prepared.thumbnail(OCR_MAX_SIZE, Image.LANCZOS)
+        if self.preprocess:
+            prepared = self._binarize(prepared)
+        return prepared
+
+    def _prepare_image_file(self, image_path):
+        """按配置处理单个图像文件，有改动时覆盖原文件。"""
+        with Image.open(image_path) as image:
+            prepared = self._prepare_image(image)
+            if prepared is image:
+                return
+        # 以无损 PNG 写回，避免再次 JPEG 压缩；Tesseract 按文件头识别格式
+        prepared.save(image_path, format="PNG")
+
+    def _binarize(self, image):
+        """按 preprocess 配置将图像二值化。"""
+        if self.preprocess == "threshold":
+            return self._threshold(image)
+        return self._adaptive_threshold(image)
+
+    def _threshold(self, image):
+        """使用 PIL 自动对比度拉伸后按全局阈值转换为 1 位图像。"""
+        gray = ImageOps.autocontrast(ImageOps.grayscale(image), cutoff=1)
+        return gray.point(lambda x: 255 if x > BINARIZE_THRESHOLD else 0, mode="1")
+
+    def _adaptive_threshold(self, image):
+        """使用 OpenCV 高斯自适应阈值将图像二值化，适应扫描件光照不均。"""
+        arr = np.asarray(image.convert("L"))
+        bin_arr = cv2.adaptiveThreshold(
+            arr, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15
+        )
+        return Image.fromarray(bin_arr)
+
+    def _cache_path(self, pdf_path, start_page):
+        """根据 PDF 内容及 OCR 参数计算缓存文件路径。"""
+        digest = hashlib.blake2b(digest_size=16)
+        with open(pdf_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        # OCR 结果还取决于以下参数，参数变化时不能复用旧缓存
+        digest.update(
+            repr(
+                (
+                    self.ocr_language,
+                    self.dpi,
+                    start_page,
+                    self.auto_rotate,
+                    self.ocr_downscale,
+                    self.preprocess,
+                    self.use_text_layer,
+                    self.text_layer_min_chars,
+                    self.skip_if_text_layer,
+                )
+            ).encode("utf-8")
+        )
+        return os.path.join(self._cache_dir, f"{digest.hexdigest()}.txt")
+
+    def _extract_text_layer(self, pdf_path, start_page=1):
+        """使用 PyMuPDF 读取 PDF 文本层，返回从 start_page 起每页文本的列表。"""
+        with fitz.open(pdf_path) as doc:
+            # 换页符在缓存中用作页分隔符，页内出现时替换为换行
+            return [
+                doc[i].get_text("text").replace("\x0c", "\n")
+                for i in range(start_page - 1, doc.page_count)
+            ]
+
+    def _has_text_layer(self, text_per_page):
+        """根据前 TEXT_LAYER_PROBE_PAGES 页的文本层判断 PDF 是否为电子版。"""
+        return any(
+            len(text.strip()) >= self.text_layer_min_chars
+            for text in text_per_page[:TEXT_LAYER_PROBE_PAGES]
+        )
+
+    def _ocr_page_ranges(self, pdf_path, page_ranges):
+        """对页码范围 [(first, last), ...] 进行转换和 OCR，返回按页排列的文本。
+
+        last 为 None 时表示直到最后一页。
+        """
+        if self._api is not None and self.use_pdfium:
+            return self._ocr_page_ranges_streaming(pdf_path, page_ranges)
+
+        image_paths = []
+        try:
+            for first_page, last_page in page_ranges:
+                image_paths += self._pdf_to_images(
+                    pdf_path, start_page=first_page, last_page=last_page
+                )
+            return self._ocr_images(image_paths)
+        finally:
+            self._remove_files(image_paths)
+
+    def _ocr_page_ranges_streaming(self, pdf_path, page_ranges):
+        """逐页渲染并立即 OCR，不写临时文件，内存中同时只保留一页图像。"""
         text_per_page = []
         try:
-            self.logger.info("开始对每一页进行OCR识别...")
-            for i, image in enumerate(images):
-                # 如果开启了自动旋转，则先修正方向
-                if self.auto_rotate:
-                    image = self._correct_orientation(image)
-
-                text = pytesseract.image_to_string(image, lang=self.ocr_language)
-                text_per_page.append(text)
-                self.logger.info("第 %d 页OCR识别完成。", i + 1)
+            for first_page, last_page in page_ranges:
+                for page_number, image in self._iter_pdfium_pages(
+                    pdf_path, first_page, last_page
+                ):
+                    text_per_page.append(self._ocr_image(self._prepare_image(image)))
+                    self.logger.info("第 %d 页OCR识别完成。", page_number)
             return text_per_page
         except Exception as exc:
             self.logger.exception("OCR识别过程中发生错误: %s", exc)
             raise
 
+    def _ocr_pdf(self, pdf_path, start_page=1):
+        """将 PDF 转换为图像并执行 OCR，返回每页文本的列表；命中缓存时直接读取。"""
+        cache_path = None
+        if self.ocr_cache:
+            cache_path = self._cache_path(pdf_path, start_page)
+            if os.path.exists(cache_path):
+                self.logger.info("使用 OCR 缓存: %s", cache_path)
+                with open(cache_path, "r", encoding="utf-8", newline="") as f:
+                    return f.read().split("\x0c")
+
+        text_per_page = None
+        if self.use_text_layer:
+            try:
+                text_per_page = self._extract_text_layer(pdf_path, start_page)
+            except Exception as exc:
+                self.logger.warning("读取 PDF 文本层失败，改为全部 OCR: %s", exc)
+
+        if text_per_page is None:
+            text_per_page = self._ocr_page_ranges(pdf_path, [(start_page, None)])
+        elif self.skip_if_text_layer and self._has_text_layer(text_per_page):
+            self.logger.info("PDF 文件 %s 含有文本层，跳过 OCR。", pdf_path)
+        else:
+            # 只对文本层为空（扫描页）的页面执行 OCR，连续页合并为一次转换
+            needs_ocr = [
+                i
+                for i, text in enumerate(text_per_page)
+                if len(text.strip()) < self.text_layer_min_chars
+            ]
+            self.logger.info(
+                "PDF 文件 %s 共 %d 页，其中 %d 页需要 OCR。",
+                pdf_path,
+                len(text_per_page),
+                len(needs_ocr),
+            )
+            page_ranges = []
+            for i in needs_ocr:
+                page = start_page + i
+                if page_ranges and page_ranges[-1][1] == page - 1:
+                    page_ranges[-1][1] = page
+                else:
+                    page_ranges.append([page, page])
+            if page_ranges:
+                ocr_texts = self._ocr_page_ranges(pdf_path, page_ranges)
+                for i, text in zip(needs_ocr, ocr_texts):
+                    text_per_page[i] = text
+
+        if cache_path:
+            try:
+                os.makedirs(self._cache_dir, exist_ok=True)
+                # 先写临时文件再替换，避免中断时留下不完整的缓存
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                    f.write("\x0c".join(text_per_page))
+                os.replace(tmp_path, cache_path)
+            except OSError as exc:
+                self.logger.warning("写入 OCR 缓存失败: %s; 异常: %s", cache_path, exc)
+        return text_per_page
+
     def _extract_marker_line(self, text_per_page, marker_string, start_page=1):
         """在 OCR 结果中查找包含标记字符串的行并返回匹配列表。
 
         返回的每项为 (page_number, match_text)
         """
+        if marker_string == self.marker:
+            marker_re = self._marker_re
+        else:
+            marker_re = compile_regex(re.escape(marker_string), self.use_re2)
+
         matches = []
         for i, page_text in enumerate(text_per_page):
             if not page_text:
                 continue
-            for line in page_text.splitlines():
-                if marker_string in line:
-                    match_text = line.strip()
-                    current_page = start_page + i
-                    self.logger.info(
-                        "第 %d 页 找到 '%s': %s",
-                        current_page,
-                        marker_string,
-                        match_text,
-                    )
-                    matches.append((current_page, match_text))
+            # 直接在整页文本上查找标记，再向两侧定位所在行，避免 splitlines 分配
+            pos = 0
+            while True:
+                m = marker_re.search(page_text, pos)
+                if not m:
+                    break
+                start = page_text.rfind("\n", 0, m.start()) + 1
+                end = page_text.find("\n", m.end())
+                if end == -1:
+                    end = len(page_text)
+                # 同一行只记录一次
+                pos = end + 1
+
+                match_text = page_text[start:end].strip()
+                current_page = start_page + i
+                self.logger.info(
+                    "第 %d 页 找到 '%s': %s",
+                    current_page,
+                    marker_string,
+                    match_text,
+                )
+                matches.append((current_page, match_text))
         if not matches:
             self.logger.debug("未找到 '%s'。", marker_string)
         return matches
@@ -151,8 +710,7 @@ class PdfOcrExtractor:
                 writer = csv.writer(csvfile)
                 if not file_exists:
                     writer.writerow(["pdf_path", "page", "text"])
-                for pdf_path, page, text in matches:
-                    writer.writerow([pdf_path, page, text])
+                writer.writerows(matches)
             self.logger.info("已将 %d 条匹配写入 CSV: %s", len(matches), csv_path)
         except (OSError, PermissionError, csv.Error) as exc:
             self.logger.exception(
@@ -170,10 +728,10 @@ class PdfOcrExtractor:
         """
         self.logger.info("开始处理PDF文件 (正则匹配): %s", pdf_path)
         matches = set()
+        pattern = compile_regex(regex_pattern, self.use_re2)
 
         try:
-            images = self._pdf_to_images(pdf_path, start_page=start_page)
-            text_per_page = self._ocr_images(images)
+            text_per_page = self._ocr_pdf(pdf_path, start_page=start_page)
 
             for i, page_text in enumerate(text_per_page):
                 if not page_text:
@@ -181,7 +739,7 @@ class PdfOcrExtractor:
 
                 # 在当前页文本中查找所有匹配项
                 # 使用 finditer 以便获取完整的匹配字符串（group(0)），无论正则是否有分组
-                for match in re.finditer(regex_pattern, page_text):
+                for match in pattern.finditer(page_text):
                     full_match = match.group(0).strip()
                     if full_match:
                         matches.add(full_match)
@@ -197,14 +755,16 @@ class PdfOcrExtractor:
             raise
 
     def extract_matches_from_pdf(self, pdf_path):
-        """处理单个 PDF：转换图像并执行 OCR，然后提取匹配并写入 CSV。"""
+        """处理单个 PDF：转换图像并执行 OCR，然后提取并返回匹配列表。
+
+        返回的每项为 (pdf_path, page, text)；开启 individual_csv 时同时写入单独的 CSV。
+        """
         self.logger.info("开始处理PDF文件: %s", pdf_path)
 
         try:
             # 复用 extract_content 的逻辑，但我们需要页码信息来写入 CSV
             # 所以这里手动调用底层方法
-            images = self._pdf_to_images(pdf_path, start_page=1)
-            text_per_page = self._ocr_images(images)
+            text_per_page = self._ocr_pdf(pdf_path, start_page=1)
             # extract_marker_line 返回 (page, text)
             matches_with_page = self._extract_marker_line(
                 text_per_page, self.marker, start_page=1
@@ -213,7 +773,7 @@ class PdfOcrExtractor:
             # 转换为 append_matches_to_csv 需要的格式 (pdf_path, page, text)
             csv_matches = [(pdf_path, page, text) for page, text in matches_with_page]
 
-            if csv_matches:
+            if csv_matches and self.individual_csv:
                 # 输出为 pdf文件名+matches.csv
                 base_name = os.path.splitext(os.path.basename(pdf_path))[0]
                 individual_csv_path = os.path.join(
@@ -231,6 +791,8 @@ class PdfOcrExtractor:
         """使用正则表达式列表在 OCR 结果中查找匹配行。"""
         if isinstance(patterns, str):
             patterns = [patterns]
+        # 在循环外编译一次，避免逐行查找 re 模块的内部缓存
+        compiled = [compile_regex(pattern, self.use_re2) for pattern in patterns]
 
         matches = []
         for i, page_text in enumerate(text_per_page):
@@ -238,13 +800,13 @@ class PdfOcrExtractor:
                 continue
             for line in page_text.splitlines():
                 line = line.strip()
-                for pattern in patterns:
-                    if re.search(pattern, line):
+                for pattern in compiled:
+                    if pattern.search(line):
                         current_page = start_page + i
                         self.logger.info(
                             "第 %d 页 找到正则匹配 [%s]: %s",
                             current_page,
-                            pattern,
+                            pattern.pattern,
                             line,
                         )
                         matches.append((current_page, line))
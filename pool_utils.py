@@ -0,0 +1,71 @@
+"""pool_utils
+
+批量处理 PDF 的脚本共用的常量与进程池辅助函数（不依赖 OCR 相关库）。
+"""
+
+import itertools
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+# PDF 扩展名的所有大小写组合 (.pdf, .pdF, ... .PDF)，供 str.endswith 直接比较，
+# 无需为每个文件名调用 lower() 生成新字符串
+PDF_SUFFIXES = tuple("." + "".join(c) for c in itertools.product(*zip("pdf", "PDF")))
+
+# 限制并行进程数上限的环境变量（如散热受限的笔记本）
+WORKERS_ENV = "PDF_OCR_WORKERS"
+
+
+def pool_size(total_files, logger, max_workers=None):
+    """
+    计算进程池大小及 executor.map 的 chunksize，返回 (max_workers, chunksize)。
+
+    进程数不超过 CPU 核心数、max_workers 和 PDF 文件数（文件很少时不创建空闲进程），
+    并可通过环境变量 PDF_OCR_WORKERS 进一步限制。chunksize 使每个进程约分到 4 批任务，
+    在减少进程间通信次数的同时保持负载均衡。
+
+    :param total_files: PDF 文件数；事先未知时传入 None
+    :param logger: 日志记录器
+    :param max_workers: 脚本自身的进程数上限，None 表示不限制
+    """
+    workers = os.cpu_count() or 1
+    if max_workers is not None:
+        workers = min(workers, max_workers)
+    if total_files is not None:
+        workers = min(workers, total_files)
+    env_workers = os.environ.get(WORKERS_ENV)
+    if env_workers:
+        try:
+            workers = min(workers, int(env_workers))
+        except ValueError:
+            logger.warning("忽略无效的 %s: %s", WORKERS_ENV, env_workers)
+    workers = max(1, workers)
+    chunksize = max(1, (total_files or 0) // (4 * workers))
+    return workers, chunksize
+
+
+def iter_map_results(executor, fn, items, chunksize, logger):
+    """
+    使用 executor.map 分批提交任务，按输入顺序逐个返回 (item, result)。
+
+    子进程崩溃（段错误、被 OOM 终止）或初始化函数出错时，executor.map 的迭代器
+    会抛出 BrokenProcessPool；此处记录日志后停止迭代，调用方仍可写出已收集的结果。
+
+    :param executor: ProcessPoolExecutor 实例
+    :param fn: 在子进程中执行的函数
+    :param items: 任务参数列表
+    :param chunksize: 每次发送给子进程的任务数
+    :param logger: 日志记录器
+    """
+    results = executor.map(fn, items, chunksize=chunksize)
+    done = 0
+    try:
+        for item, result in zip(items, results):
+            done += 1
+            yield item, result
+    except BrokenProcessPool as exc:
+        logger.error(
+            "进程池异常终止（子进程崩溃或初始化失败），已返回 %d/%d 个结果: %s",
+            done,
+            len(items),
+            exc,
+        )
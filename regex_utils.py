@@ -0,0 +1,35 @@
+"""regex_utils
+
+各脚本共用的正则表达式编译与缓存（不依赖 OCR 相关库）。
+"""
+
+import functools
+import re
+
+try:
+    # 可选依赖：google-re2，基于 DFA 的线性时间正则匹配，不会出现回溯爆炸
+    import re2
+except ImportError:
+    re2 = None
+
+
+@functools.lru_cache(maxsize=128)
+def compile_regex(pattern, use_re2=False):
+    """
+    编译并缓存正则表达式，同一模式在多页、多个 PDF 之间只编译一次。
+
+    use_re2=True 且安装了 google-re2 时使用 re2；re2 不支持的语法
+    （如前后断言、反向引用）自动退回到标准库 re。
+    注意 re2 中 \\d、\\w、\\s、\\b 只匹配 ASCII 字符：\\w 不匹配汉字，
+    \\d 不匹配全角数字，\\s 不匹配全角空格 (U+3000)，匹配结果可能与 re 不同，
+    因此默认不启用。
+
+    :param pattern: 正则表达式字符串
+    :param use_re2: 是否优先使用 re2
+    """
+    if use_re2 and re2 is not None and isinstance(pattern, str):
+        try:
+            return re2.compile(pattern)
+        except re2.error:
+            pass
+    return re.compile(pattern)
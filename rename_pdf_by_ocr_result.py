@@ -10,12 +10,17 @@
 
 import os
 import re
+import errno
 import csv
 import yaml
 import logging
 import argparse
 from pathlib import Path
 from logging_config import setup_logger
+from regex_utils import compile_regex
+
+# 文件名中不允许出现的字符
+ILLEGAL_CHARS_RE = re.compile(r'[\\/*?:"<>|]')
 
 
 def load_config(config_path):
@@ -24,9 +29,41 @@ def load_config(config_path):
         return yaml.safe_load(f)
 
 
-def rename_pdfs(config_path):
+def rename_no_replace(src, dst):
+    """
+    重命名文件，目标文件已存在时抛出 FileExistsError，绝不覆盖已有文件。
+
+    POSIX 下先 os.link 再删除原文件，link 在目标存在时原子地失败；
+    Windows 下 os.rename 本身不会覆盖已有文件。
+    仅大小写不同的重命名在不区分大小写的文件系统上指向同一文件，单独处理。
+    """
+    if os.name == "nt":
+        os.rename(src, dst)
+        return
+    if src.name.casefold() == dst.name.casefold():
+        if dst.exists() and not os.path.samefile(src, dst):
+            raise FileExistsError(errno.EEXIST, "目标文件已存在", str(dst))
+        os.rename(src, dst)
+        return
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError:
+        # 文件系统不支持硬链接（如 FAT、部分网络共享），退回到先检查再重命名
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, "目标文件已存在", str(dst))
+        os.rename(src, dst)
+        return
+    os.unlink(src)
+
+
+def rename_pdfs(config_path, dry_run=False):
     """
     根据 OCR 结果 CSV 文件重命名 PDF。
+
+    先读取所有 CSV 生成重命名计划并在内存中检查目标文件名冲突，
+    再统一执行重命名；dry_run=True 时只输出计划，不修改文件。
     """
     config = load_config(config_path)
 
@@ -48,46 +85,80 @@ def rename_pdfs(config_path):
         return
 
     # 遍历输出目录下的 CSV 文件
-    csv_files = list(output_dir.glob("*_ocr_results.csv"))
+    with os.scandir(output_dir) as it:
+        csv_files = [
+            Path(e.path)
+            for e in it
+            if e.name.endswith("_ocr_results.csv") and e.is_file(follow_symlinks=False)
+        ]
     if not csv_files:
         logger.warning(f"在 {output_dir} 下未找到匹配 *_ocr_results.csv 的文件。")
         return
 
     logger.info(f"找到 {len(csv_files)} 个 OCR 结果文件。")
 
+    # 一次性读取 PDF 目录中已有的文件名，之后的存在性与冲突检查都在内存中完成。
+    # 冲突检查统一用 casefold 比较，兼容不区分大小写的文件系统
+    # （Windows、macOS、挂载的 SMB/NTFS 等）；实际重命名时仍由
+    # rename_no_replace 保证不会覆盖已有文件
+    try:
+        with os.scandir(pdf_dir) as it:
+            entries = list(it)
+    except OSError as e:
+        logger.error(f"无法读取 PDF 目录 {pdf_dir}: {e}")
+        return
+    # 只处理普通文件（不跟随符号链接），但任何已存在的目录项都视为占用了该名称
+    # casefold 后的文件名 -> 磁盘上的实际文件名，使 X.PDF 也能对应到 X_ocr_results.csv
+    existing_names = {
+        e.name.casefold(): e.name for e in entries if e.is_file(follow_symlinks=False)
+    }
+    taken_names = {e.name.casefold() for e in entries}
+
+    # 正则表达式在循环外编译一次（use_re2 开启时使用 re2）
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    use_re2 = config.get("use_re2", False)
+    compiled = [compile_regex(pattern, use_re2) for pattern in patterns]
+
     success_count = 0
     fail_count = 0
     skip_count = 0
 
+    # 第一遍：生成重命名计划 [(原路径, 新路径)]
+    plan = []
     for csv_path in csv_files:
         try:
             # 获取原文件名 (old_pdf_name)
             old_pdf_name = csv_path.name.replace("_ocr_results.csv", "")
             old_pdf_file = pdf_dir / f"{old_pdf_name}.pdf"
 
-            if not old_pdf_file.exists():
+            actual_name = existing_names.get(old_pdf_file.name.casefold())
+            if actual_name is None:
                 logger.warning(f"未找到对应的 PDF 文件: {old_pdf_file}，跳过处理。")
                 skip_count += 1
                 continue
+            # 使用磁盘上的实际文件名（扩展名大小写可能不同）
+            old_pdf_file = pdf_dir / actual_name
 
             # 读取 CSV 获取匹配内容
             new_pdf_name = None
             matched_text = ""
 
-            # 使用 utf-8-sig 处理可能存在的 BOM
-            with open(csv_path, mode="r", encoding="utf-8-sig") as csvfile:
-                reader = csv.DictReader(csvfile)
+            # 使用 utf-8-sig 处理可能存在的 BOM；
+            # 只需要首行的一列，用 csv.reader 按表头定位列号，不为每行构建字典
+            with open(csv_path, mode="r", encoding="utf-8-sig", newline="") as csvfile:
+                reader = csv.reader(csvfile)
+                header = next(reader, None)
                 first_row = next(reader, None)
 
-                if first_row and "Matched_Text" in first_row:
-                    matched_text = first_row["Matched_Text"].strip()
+                if header and "Matched_Text" in header and first_row:
+                    idx = header.index("Matched_Text")
+                    if idx < len(first_row):
+                        matched_text = first_row[idx].strip()
 
                     # 按照配置文件中的正则表达式进行匹配
-                    if isinstance(patterns, str):
-                        patterns = [patterns]
-
-                    for pattern in patterns:
-                        match = re.search(pattern, matched_text)
+                    for pattern in compiled:
+                        match = pattern.search(matched_text)
                         if match:
                             # 提取匹配的内容作为新文件名
                             new_pdf_name = match.group(0)
@@ -95,22 +166,20 @@ def rename_pdfs(config_path):
 
             if new_pdf_name:
                 # 清洗文件名，移除非法字符
-                new_pdf_name = re.sub(r'[\\/*?:"<>|]', "_", new_pdf_name)
+                new_pdf_name = ILLEGAL_CHARS_RE.sub("_", new_pdf_name)
                 new_pdf_file = pdf_dir / f"{new_pdf_name}.pdf"
+                new_key = new_pdf_file.name.casefold()
 
-                # 如果目标文件名已存在且不是当前处理的文件（避免大小写或相同命名的冲突）
-                if (
-                    new_pdf_file.exists()
-                    and new_pdf_file.resolve() != old_pdf_file.resolve()
-                ):
+                # 如果目标文件名已存在或已被计划占用，且不是当前处理的文件
+                # （避免大小写或相同命名的冲突）
+                if new_key in taken_names and new_key != old_pdf_file.name.casefold():
                     logger.error(
                         f"目标文件名已存在: {new_pdf_file}，无法重命名 {old_pdf_name}"
                     )
                     fail_count += 1
                 else:
-                    os.rename(old_pdf_file, new_pdf_file)
-                    logger.info(f"成功重命名: {old_pdf_name}.pdf -> {new_pdf_name}.pdf")
-                    success_count += 1
+                    taken_names.add(new_key)
+                    plan.append((old_pdf_file, new_pdf_file))
             else:
                 logger.warning(
                     f"文件 {csv_path.name} 的内容中未找到符合正则表达式的匹配项。原内容: {matched_text}"
@@ -123,6 +192,30 @@ def rename_pdfs(config_path):
             )
             fail_count += 1
 
+    # 第二遍：按计划执行重命名
+    for old_pdf_file, new_pdf_file in plan:
+        if dry_run:
+            logger.info(f"[dry-run] {old_pdf_file.name} -> {new_pdf_file.name}")
+            continue
+        if old_pdf_file.name == new_pdf_file.name:
+            logger.info(f"文件名无需修改: {old_pdf_file.name}")
+            success_count += 1
+            continue
+        try:
+            rename_no_replace(old_pdf_file, new_pdf_file)
+            logger.info(f"成功重命名: {old_pdf_file.name} -> {new_pdf_file.name}")
+            success_count += 1
+        except FileExistsError:
+            logger.error(
+                f"目标文件名已存在: {new_pdf_file}，无法重命名 {old_pdf_file.name}"
+            )
+            fail_count += 1
+        except OSError as e:
+            logger.error(f"重命名 {old_pdf_file.name} 时发生异常: {str(e)}")
+            fail_count += 1
+
+    if dry_run:
+        logger.info(f"[dry-run] 计划重命名 {len(plan)} 个文件，未修改任何文件。")
     logger.info(
         f"任务完成! 成功: {success_count}, 失败: {fail_count}, 跳过: {skip_count}"
     )
@@ -134,6 +227,9 @@ if __name__ == "__main__":
     parser.add_argument(
         "--config", type=str, default="config_B24.yaml", help="配置文件路径 (YAML格式)"
     )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="只输出重命名计划，不实际修改文件"
+    )
     args = parser.parse_args()
 
     # 确保配置文件绝对路径
@@ -142,4 +238,4 @@ if __name__ == "__main__":
     if not os.path.exists(config_path):
         print(f"配置文件未找到: {config_path}")
     else:
-        rename_pdfs(config_path)
+        rename_pdfs(config_path, dry_run=args.dry_run)
@@ -12,11 +12,12 @@ import yaml
 import logging
 import concurrent.futures
 import csv
-import re
 import warnings
 from PIL import Image
 from logging_config import setup_logger
+from pool_utils import PDF_SUFFIXES, iter_map_results, pool_size
 from pdf_ocr_extractor import PdfOcrExtractor
+from regex_utils import compile_regex
 
 # 优化并行性能：限制 Tesseract/OpenMP 每个进程只使用一个线程
 # 这样可以安全地运行与 CPU 核心数相同数量的并行进程
@@ -25,6 +26,10 @@ os.environ["OMP_THREAD_LIMIT"] = "1"
 # 将 DecompressionBombWarning 设置为错误，以便捕获
 warnings.simplefilter("error", Image.DecompressionBombWarning)
 
+# 工作进程内的提取器实例与文件名正则，由 _init_worker 在进程启动时设置
+_EXTRACTOR = None
+_FILENAME_REGEX = None
+
 
 def load_config(config_path="./config.yaml"):
     """从 YAML 配置文件加载配置并返回字典。"""
@@ -33,20 +38,28 @@ def load_config(config_path="./config.yaml"):
     return conf
 
 
-def verify_pdf_wrapper(args):
+def _init_worker(config, filename_regex):
+    """
+    工作进程初始化函数：每个进程只创建一次提取器，
+    Tesseract 模型等资源在该进程处理的所有 PDF 之间复用。
+    config 与 filename_regex 只在进程启动时传递一次，任务只需传递 PDF 路径。
+    """
+    global _EXTRACTOR, _FILENAME_REGEX
+    _EXTRACTOR = PdfOcrExtractor(config)
+    _FILENAME_REGEX = filename_regex
+
+
+def verify_pdf_wrapper(pdf_path):
     """
     并行验证的包装函数。
 
-    :param args: 元组 (pdf_path, config, filename_regex)
+    :param pdf_path: PDF 文件路径
     :return: (matches, error_message)
     """
-    pdf_path, config, filename_regex = args
     try:
-        # 在子进程中初始化提取器
-        extractor = PdfOcrExtractor(config)
         # 提取正则匹配内容，从第2页开始
-        matches = extractor.extract_regex_matches(
-            pdf_path, filename_regex, start_page=2
+        matches = _EXTRACTOR.extract_regex_matches(
+            pdf_path, _FILENAME_REGEX, start_page=2
         )
         return matches, None
     except Image.DecompressionBombWarning:
@@ -96,13 +109,16 @@ def main():
 
     logger.info("开始验证目录 %s 中的 PDF 文件...", pdf_directory)
     logger.info("使用的正则表达式: %s", filename_regex)
+    # 只编译一次（use_re2 开启时使用 re2）；子进程中由提取器自行编译并缓存
+    filename_re = compile_regex(filename_regex, config.get("use_re2", False))
 
     # 收集所有 PDF 文件路径
-    pdf_files = [
-        os.path.join(pdf_directory, f)
-        for f in os.listdir(pdf_directory)
-        if f.lower().endswith(".pdf")
-    ]
+    with os.scandir(pdf_directory) as it:
+        pdf_files = [
+            e.path
+            for e in it
+            if e.name.endswith(PDF_SUFFIXES) and e.is_file(follow_symlinks=False)
+        ]
 
     total_files = len(pdf_files)
     if total_files == 0:
@@ -117,136 +133,120 @@ def main():
     unmatch_csv_path = os.path.join(output_directory, "unmatches.csv")
     skipped_csv_path = os.path.join(output_directory, "skipped_errors.csv")
 
-    # 初始化 CSV 文件
+    # 两个 CSV 文件在整个验证过程中保持打开，避免每个文件都重新打开
     try:
-        with open(unmatch_csv_path, "w", encoding="utf-8", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["file_name", "filename_match", "ocr_matches"])
-
-        with open(skipped_csv_path, "w", encoding="utf-8", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["file_name", "error_type"])
+        unmatch_file = open(unmatch_csv_path, "w", encoding="utf-8", newline="")
+    except Exception as e:
+        logger.error("无法创建 CSV 文件: %s", e)
+        return
+    try:
+        skipped_file = open(skipped_csv_path, "w", encoding="utf-8", newline="")
     except Exception as e:
+        unmatch_file.close()
         logger.error("无法创建 CSV 文件: %s", e)
         return
 
+    unmatch_writer = csv.writer(unmatch_file)
+    skipped_writer = csv.writer(skipped_file)
+
     count = 0
     mismatch_count = 0
+    # 结果行先缓存在内存中，处理完成后按文件名排序再一次性写入
+    unmatch_rows = []
+    skipped_rows = []
 
-    # 显式设置 max_workers 为 CPU 核心数，确保充分利用 32 核
-    max_workers = os.cpu_count()
+    max_workers, chunksize = pool_size(total_files, logger)
     logger.info("使用 %d 个并行进程进行处理...", max_workers)
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
-        future_to_pdf = {
-            executor.submit(
-                verify_pdf_wrapper, (pdf_path, config, filename_regex)
-            ): pdf_path
-            for pdf_path in pdf_files
-        }
-
-        for future in concurrent.futures.as_completed(future_to_pdf):
-            pdf_path = future_to_pdf[future]
-            file_name = os.path.basename(pdf_path)
-
-            try:
-                matches, error = future.result()
-
-                if error:
-                    if (
-                        "DecompressionBombWarning" in error
-                        or "DecompressionBombError" in error
-                    ):
-                        logger.warning(
-                            "文件 %s 触发 DecompressionBombWarning/Error，跳过处理。",
-                            file_name,
-                        )
-                        with open(
-                            skipped_csv_path, "a", encoding="utf-8", newline=""
-                        ) as f:
-                            writer = csv.writer(f)
+    try:
+        unmatch_writer.writerow(["file_name", "filename_match", "ocr_matches"])
+        skipped_writer.writerow(["file_name", "error_type"])
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(config, filename_regex),
+        ) as executor:
+            for pdf_path, (matches, error) in iter_map_results(
+                executor, verify_pdf_wrapper, pdf_files, chunksize, logger
+            ):
+                file_name = os.path.basename(pdf_path)
+
+                try:
+                    if error:
+                        if (
+                            "DecompressionBombWarning" in error
+                            or "DecompressionBombError" in error
+                        ):
+                            logger.warning(
+                                "文件 %s 触发 DecompressionBombWarning/Error，跳过处理。",
+                                file_name,
+                            )
                             # 记录具体的错误类型 (Warning 或 Error)
-                            writer.writerow([file_name, error])
-                    else:
-                        logger.error("处理文件 %s 时出错: %s", file_name, error)
-                    continue
-
-                # 如果没有匹配到任何内容，直接跳过，不记录
-                if not matches:
-                    logger.info("文件 %s 未匹配到任何正则内容，跳过。", file_name)
-                    continue
-
-                # 1. 从文件名中提取符合正则的字符串
-                filename_match_obj = re.search(filename_regex, file_name)
-                filename_match_str = (
-                    filename_match_obj.group(0) if filename_match_obj else None
-                )
-
-                if not filename_match_str:
-                    logger.warning("文件名 %s 不符合正则表达式规则", file_name)
-                    # 如果文件名本身都不符合规则，记录为 mismatch
-                    with open(unmatch_csv_path, "a", encoding="utf-8", newline="") as f:
-                        writer = csv.writer(f)
-                        writer.writerow(
-                            [file_name, "NO_MATCH_IN_FILENAME", str(matches)]
-                        )
-                    mismatch_count += 1
-                    continue
-
-                # 2. 检查 OCR 结果中是否包含该字符串
-                is_match = False
-                if filename_match_str in matches:
-                    is_match = True
-
-                if is_match:
-                    logger.info(
-                        "验证通过: 文件名匹配 '%s' 在 OCR 结果中找到",
-                        filename_match_str,
-                    )
-                else:
-                    logger.warning(
-                        "验证失败: 文件名匹配 '%s' 未在 OCR 结果 %s 中找到",
-                        filename_match_str,
-                        matches,
+                            skipped_rows.append([file_name, error])
+                        else:
+                            logger.error("处理文件 %s 时出错: %s", file_name, error)
+                        continue
+
+                    # 如果没有匹配到任何内容，直接跳过，不记录
+                    if not matches:
+                        logger.info("文件 %s 未匹配到任何正则内容，跳过。", file_name)
+                        continue
+
+                    # 1. 从文件名中提取符合正则的字符串
+                    filename_match_obj = filename_re.search(file_name)
+                    filename_match_str = (
+                        filename_match_obj.group(0) if filename_match_obj else None
                     )
-                    mismatch_count += 1
-                    # 写入 unmatches.csv
-                    with open(unmatch_csv_path, "a", encoding="utf-8", newline="") as f:
-                        writer = csv.writer(f)
-                        writer.writerow([file_name, filename_match_str, str(matches)])
 
-                count += 1
+                    if not filename_match_str:
+                        logger.warning("文件名 %s 不符合正则表达式规则", file_name)
+                        # 如果文件名本身都不符合规则，记录为 mismatch
+                        unmatch_rows.append(
+                            [file_name, "NO_MATCH_IN_FILENAME", str(matches)]
+                        )
+                        mismatch_count += 1
+                        continue
+
+                    # 2. 检查 OCR 结果中是否包含该字符串
+                    is_match = False
+                    if filename_match_str in matches:
+                        is_match = True
+
+                    if is_match:
+                        logger.info(
+                            "验证通过: 文件名匹配 '%s' 在 OCR 结果中找到",
+                            filename_match_str,
+                        )
+                    else:
+                        logger.warning(
+                            "验证失败: 文件名匹配 '%s' 未在 OCR 结果 %s 中找到",
+                            filename_match_str,
+                            matches,
+                        )
+                        mismatch_count += 1
+                        # 记录到 unmatches.csv
+                        unmatch_rows.append(
+                            [file_name, filename_match_str, str(matches)]
+                        )
 
-            except Exception as exc:
-                logger.error("处理文件 %s 时发生未捕获异常: %s", file_name, exc)
+                    count += 1
 
-    logger.info("验证完成。共处理 %d 个文件，发现 %d 个不匹配。", count, mismatch_count)
+                except Exception as exc:
+                    logger.error("处理文件 %s 时发生未捕获异常: %s", file_name, exc)
 
-    # 对结果文件进行排序
-    def sort_csv(file_path):
-        if not os.path.exists(file_path):
-            return
+    finally:
+        # 即使中途出错或被中断，也按第一列 (file_name) 排序后写入已收集的结果
         try:
-            with open(file_path, "r", encoding="utf-8", newline="") as f:
-                reader = csv.reader(f)
-                rows = list(reader)
-
-            if len(rows) > 1:
-                header = rows[0]
-                data = rows[1:]
-                # 按第一列 (file_name) 排序
-                data.sort(key=lambda x: x[0])
-
-                with open(file_path, "w", encoding="utf-8", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow(header)
-                    writer.writerows(data)
-                logger.info("已对文件进行排序: %s", file_path)
-        except Exception as e:
-            logger.error("排序文件 %s 时出错: %s", file_path, e)
-
-    sort_csv(unmatch_csv_path)
-    sort_csv(skipped_csv_path)
+            unmatch_rows.sort(key=lambda row: row[0])
+            skipped_rows.sort(key=lambda row: row[0])
+            unmatch_writer.writerows(unmatch_rows)
+            skipped_writer.writerows(skipped_rows)
+        finally:
+            unmatch_file.close()
+            skipped_file.close()
+
+    logger.info("验证完成。共处理 %d 个文件，发现 %d 个不匹配。", count, mismatch_count)
 
 
 if __name__ == "__main__":